@@ -1,14 +1,85 @@
 import requests
-import xmltodict
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import json
-from typing import Dict, List, Optional, Tuple
+from typing import Callable, Dict, Iterable, Iterator, List, Mapping, Optional, Tuple
+from types import MappingProxyType
 from dataclasses import dataclass
 from datetime import datetime
+from pathlib import Path
+from threading import Event
 import time
 from PyQt6.QtCore import QObject, pyqtSignal
 
+try:
+    from lxml import etree
+except ImportError:  # 未安装lxml时回退到xmltodict
+    etree = None
+    import xmltodict
+
+try:
+    import requests_cache
+except ImportError:  # 未安装requests-cache时不缓存搜索结果
+    requests_cache = None
+
+# Atom命名空间前缀
+ATOM = '{http://www.w3.org/2005/Atom}'
+
+# 可用的arXiv分类(只读)
+_ALL_CATEGORIES = MappingProxyType({
+    'cs.AI': '人工智能',
+    'cs.CL': '计算语言学',
+    'cs.CV': '计算机视觉',
+    'cs.LG': '机器学习',
+    'cs.NE': '神经网络',
+    'stat.ML': '机器学习(统计)',
+    'math.OC': '优化和控制',
+    # ... 可以添加更多分类
+})
+
+
+def create_session(
+        retries: int = 3,
+        backoff_factor: float = 0.5,
+        pool_maxsize: int = 8,
+        cache_expire: Optional[int] = None
+) -> requests.Session:
+    """
+    创建复用连接的HTTP会话(keep-alive + 连接池),对限流和服务端错误自动重试
+
+    参数:
+        retries (int): 最大重试次数
+        backoff_factor (float): 指数退避的基数(秒)
+        pool_maxsize (int): 每个主机保留的最大连接数
+        cache_expire (int): 可选,搜索结果的缓存时间(秒),需要安装requests-cache
+
+    返回:
+        requests.Session: 配置好的会话
+    """
+    if cache_expire and requests_cache is not None:
+        # 只缓存API查询,PDF下载不进缓存
+        session = requests_cache.CachedSession(
+            './.cache/arxiv',
+            backend='sqlite',
+            urls_expire_after={
+                'export.arxiv.org/api': cache_expire,
+                '*': requests_cache.DO_NOT_CACHE
+            }
+        )
+    else:
+        session = requests.Session()
+    session.headers['User-Agent'] = 'arxiv-Summarizer/1.0'
+    adapter = HTTPAdapter(
+        pool_connections=4,
+        pool_maxsize=pool_maxsize,
+        max_retries=Retry(total=retries, backoff_factor=backoff_factor, status_forcelist=(429, 500, 502, 503, 504))
+    )
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
 
-@dataclass
+
+@dataclass(slots=True, frozen=True)
 class ArxivPaper:
     """论文数据类"""
     title: str
@@ -23,32 +94,65 @@ class ArxivPaper:
     arxiv_url: str
 
     @classmethod
-    def from_api_response(cls, entry: Dict) -> 'ArxivPaper':
-        """从API响应创建论文对象"""
+    def from_lxml(cls, entry: 'etree._Element') -> 'ArxivPaper':
+        """从Atom <entry> 元素创建论文对象"""
         # 处理作者信息
-        if isinstance(entry.get('author', []), list):
-            authors = [author['name'] for author in entry['author']]
-        else:
-            authors = [entry['author']['name']]
+        authors = [name.text for name in entry.findall(f'{ATOM}author/{ATOM}name')]
 
         # 处理分类信息
-        if isinstance(entry.get('category', []), list):
-            categories = [cat['@term'] for cat in entry['category']]
-        else:
-            categories = [entry['category']['@term']] if entry.get('category') else []
+        categories = [cat.get('term') for cat in entry.findall(f'{ATOM}category')]
+
+        # 一次遍历获取PDF和arXiv链接
+        pdf_url = ''
+        arxiv_url = ''
+        for link in entry.iterfind(f'{ATOM}link'):
+            link_get = link.get
+            if link_get('title') == 'pdf':
+                pdf_url = link_get('href')
+            elif link_get('rel') == 'alternate':
+                arxiv_url = link_get('href')
+
+        findtext = entry.findtext
+        return cls(
+            title=findtext(f'{ATOM}title', '').replace('\n', ' ').strip(),
+            abstract=findtext(f'{ATOM}summary', '').replace('\n', ' ').strip(),
+            authors=authors,
+            paper_id=findtext(f'{ATOM}id', '').split('/abs/')[-1],
+            pdf_url=pdf_url,
+            published_date=findtext(f'{ATOM}published', ''),
+            updated_date=findtext(f'{ATOM}updated', ''),
+            categories=categories,
+            primary_category=categories[0] if categories else '',
+            arxiv_url=arxiv_url
+        )
 
-        # 获取PDF和arXiv链接
-        pdf_url = next((link['@href'] for link in entry['link'] if link.get('@title') == 'pdf'), '')
-        arxiv_url = next((link['@href'] for link in entry['link'] if link.get('@title') is None), '')
+    @classmethod
+    def from_api_response(cls, entry: Dict) -> 'ArxivPaper':
+        """从xmltodict解析结果创建论文对象(lxml不可用时使用)"""
+        get = entry.get
+
+        # 处理作者和分类信息(force_list保证它们总是列表);空元素被解析为None,统一按空字符串处理
+        authors = [author['name'] for author in entry['author']]
+        categories = [cat['@term'] for cat in get('category', [])]
+
+        # 一次遍历获取PDF和arXiv链接
+        pdf_url = ''
+        arxiv_url = ''
+        for link in entry['link']:
+            title = link.get('@title')
+            if title == 'pdf':
+                pdf_url = link['@href']
+            elif title is None:
+                arxiv_url = link['@href']
 
         return cls(
-            title=entry['title'].replace('\n', ' ').strip(),
-            abstract=entry['summary'].replace('\n', ' ').strip(),
+            title=(get('title') or '').replace('\n', ' ').strip(),
+            abstract=(get('summary') or '').replace('\n', ' ').strip(),
             authors=authors,
-            paper_id=entry['id'].split('/abs/')[-1],
+            paper_id=(get('id') or '').split('/abs/')[-1],
             pdf_url=pdf_url,
-            published_date=entry['published'],
-            updated_date=entry['updated'],
+            published_date=(get('published') or ''),
+            updated_date=(get('updated') or ''),
             categories=categories,
             primary_category=categories[0] if categories else '',
             arxiv_url=arxiv_url
@@ -65,18 +169,29 @@ class ArxivAPI(QObject):
     download_finished = pyqtSignal(str)  # 发送保存路径
     download_error = pyqtSignal(str)  # 发送下载错误信息
 
-    def __init__(self):
+    def __init__(self, session: Optional[requests.Session] = None):
         super().__init__()
         self.base_url = "http://export.arxiv.org/api/query"
-        self.last_request_time = 0
         self.min_request_interval = 3  # 最小请求间隔(秒)
+        self.last_request_time = -self.min_request_interval  # 单调时钟时间,首次请求无需等待
+
+        # 可传入共享的HTTP会话,否则自行创建
+        self._owns_session = session is None
+        self.session = session if session is not None else create_session()
+
+    def close(self):
+        """关闭自行创建的HTTP会话,释放连接池"""
+        if self._owns_session:
+            self.session.close()
 
     def _wait_for_rate_limit(self):
         """等待以遵守速率限制"""
-        elapsed = time.time() - self.last_request_time
+        now = time.monotonic()
+        elapsed = now - self.last_request_time
         if elapsed < self.min_request_interval:
             time.sleep(self.min_request_interval - elapsed)
-        self.last_request_time = time.time()
+            now = time.monotonic()
+        self.last_request_time = now
 
     def search(
             self,
@@ -85,7 +200,9 @@ class ArxivAPI(QObject):
             max_results: int = 10,
             sort_by: str = 'relevance',
             sort_order: str = 'descending',
-            categories: Optional[List[str]] = None
+            categories: Optional[List[str]] = None,
+            batch_callback: Optional[Callable[[List[ArxivPaper]], None]] = None,
+            batch_size: int = 3
     ) -> List[ArxivPaper]:
         """
         搜索arXiv论文
@@ -97,6 +214,8 @@ class ArxivAPI(QObject):
             sort_by (str): 排序方式 ('relevance', 'lastUpdatedDate', 'submittedDate')
             sort_order (str): 排序顺序 ('ascending', 'descending')
             categories (List[str]): 限制搜索的分类列表
+            batch_callback (Callable): 可选,边解析边按批传入已解析的论文(不含最后不足一批的部分)
+            batch_size (int): 每批的论文数
 
         返回:
             List[ArxivPaper]: 论文对象列表
@@ -119,23 +238,42 @@ class ArxivAPI(QObject):
                 'sortOrder': sort_order
             }
 
-            # 等待速率限制
-            self._wait_for_rate_limit()
-
-            # 发送请求
-            response = requests.get(self.base_url, params=params)
-            response.raise_for_status()
-
-            # 解析响应
-            data = xmltodict.parse(response.text)
-            entries = data['feed'].get('entry', [])
-
-            # 确保entries是列表
-            if not isinstance(entries, list):
-                entries = [entries]
-
-            # 转换为论文对象
-            papers = [ArxivPaper.from_api_response(entry) for entry in entries]
+            # 命中缓存时无需访问arXiv,也不受速率限制
+            caching = self._caching()
+            response = self._get_cached(params) if caching else None
+            from_cache = response is not None
+            if not from_cache:
+                # 等待速率限制
+                self._wait_for_rate_limit()
+
+                # 发送请求(流式读取,边接收边解析);启用缓存时让CachedSession跳过写入,
+                # 否则它会先读完整个响应再返回,解析完成后再由 _store_in_cache 写入
+                headers = {'Cache-Control': 'no-store'} if caching else None
+                response = self.session.get(
+                    self.base_url, params=params, headers=headers, stream=True, timeout=(5, 30)
+                )
+
+            with response:
+                response.raise_for_status()
+
+                # 解析响应;缓存的响应已在内存中,直接解析其内容
+                if etree is not None:
+                    received = []  # 流式收到的数据,用于写入缓存
+                    if from_cache:
+                        chunks = (response.content,)
+                    else:
+                        chunks = self._record_chunks(response.iter_content(8 * 1024), received)
+                    papers = []
+                    for paper in self._iter_papers_lxml(chunks):
+                        papers.append(paper)
+                        if batch_callback and len(papers) % batch_size == 0:
+                            batch_callback(papers[-batch_size:])
+                    if caching and not from_cache:
+                        self._store_in_cache(response, b''.join(received))
+                else:
+                    papers = self._parse_with_xmltodict(response.content)
+                    if caching and not from_cache:
+                        self._store_in_cache(response, response.content)
 
             self.search_finished.emit(papers)
             return papers
@@ -145,34 +283,113 @@ class ArxivAPI(QObject):
             self.search_error.emit(error_msg)
             return []
 
-    def download_paper(self, paper: ArxivPaper, save_path: str) -> bool:
+    def _caching(self) -> bool:
+        """会话是否启用了requests-cache缓存"""
+        return requests_cache is not None and isinstance(self.session, requests_cache.CachedSession)
+
+    def _get_cached(self, params: dict) -> Optional[requests.Response]:
+        """返回缓存中未过期的搜索响应,未缓存时返回None"""
+        response = self.session.get(self.base_url, params=params, only_if_cached=True)
+        if response.status_code == 504:  # requests-cache 以504表示缓存未命中
+            response.close()
+            return None
+        return response
+
+    @staticmethod
+    def _record_chunks(chunks: Iterable[bytes], received: List[bytes]) -> Iterator[bytes]:
+        """原样产出数据块,同时记录到 received 中"""
+        for chunk in chunks:
+            received.append(chunk)
+            yield chunk
+
+    def _store_in_cache(self, response: requests.Response, content: bytes):
+        """将已流式读取完的搜索响应写入缓存,过期时间按会话的配置计算"""
+        settings = self.session.settings
+        expire_after = requests_cache.get_url_expiration(response.url, settings.urls_expire_after)
+        if expire_after is None:
+            expire_after = settings.expire_after
+        if expire_after == requests_cache.DO_NOT_CACHE:
+            return
+        response._content = content
+        self.session.cache.save_response(
+            response, expires=requests_cache.get_expiration_datetime(expire_after)
+        )
+
+    @staticmethod
+    def _iter_papers_lxml(chunks: Iterable[bytes]) -> Iterator[ArxivPaper]:
+        """使用lxml增量解析Atom响应,每收到一块数据就产出其中已完整的论文"""
+        parser = etree.XMLPullParser(events=('end',), tag=f'{ATOM}entry')
+        for chunk in chunks:
+            parser.feed(chunk)
+            for _, elem in parser.read_events():
+                yield ArxivPaper.from_lxml(elem)
+                # 释放已处理的节点
+                elem.clear()
+                while elem.getprevious() is not None:
+                    del elem.getparent()[0]
+        parser.close()
+
+    @staticmethod
+    def _parse_with_xmltodict(content: bytes) -> List[ArxivPaper]:
+        """使用xmltodict解析Atom响应(lxml不可用时的回退方案)"""
+        # 直接传入字节,由expat解码;xmltodict已在其expat解析器上启用buffer_text
+        data = xmltodict.parse(
+            content,
+            encoding='utf-8',
+            force_list={'entry', 'author', 'category', 'link'}
+        )
+        entries = data['feed'].get('entry', [])
+        return [ArxivPaper.from_api_response(entry) for entry in entries]
+
+    def download_paper(
+            self,
+            paper: ArxivPaper,
+            save_path: str,
+            block_size: int = 64 * 1024,
+            progress_callback: Optional[Callable[[int], None]] = None,
+            cancel_event: Optional[Event] = None
+    ) -> bool:
         """
-        下载论文PDF
+        以流式方式下载论文PDF,边下载边写入磁盘
 
         参数:
             paper (ArxivPaper): 论文对象
             save_path (str): 保存路径
+            block_size (int): 每次读取的字节数
+            progress_callback (Callable): 可选,进度(0-100)变化时调用
+            cancel_event (Event): 可选,被设置后中止下载并删除已写入的部分
 
         返回:
             bool: 下载是否成功
         """
         try:
-            response = requests.get(paper.pdf_url, stream=True)
-            response.raise_for_status()
-
-            # 获取文件大小
-            total_size = int(response.headers.get('content-length', 0))
-            block_size = 8192
-            downloaded = 0
-
-            with open(save_path, 'wb') as f:
-                for data in response.iter_content(block_size):
-                    downloaded += len(data)
-                    f.write(data)
-
-                    if total_size:
-                        progress = int((downloaded / total_size) * 100)
-                        self.download_progress.emit(progress)
+            with self.session.get(paper.pdf_url, stream=True, timeout=(10, 60)) as response:
+                response.raise_for_status()
+
+                # 获取文件大小
+                total_size = int(response.headers.get('content-length', 0))
+                downloaded = 0
+                last_progress = -1
+
+                with open(save_path, 'wb') as f:
+                    for data in response.iter_content(block_size):
+                        if cancel_event is not None and cancel_event.is_set():
+                            break
+                        downloaded += len(data)
+                        f.write(data)
+
+                        if total_size:
+                            progress = int((downloaded / total_size) * 100)
+                            # 仅在进度变化时通知,避免淹没事件循环
+                            if progress != last_progress:
+                                self.download_progress.emit(progress)
+                                if progress_callback:
+                                    progress_callback(progress)
+                                last_progress = progress
+
+            if cancel_event is not None and cancel_event.is_set():
+                Path(save_path).unlink(missing_ok=True)
+                return False
 
             self.download_finished.emit(save_path)
             return True
@@ -220,23 +437,14 @@ class ArxivAPI(QObject):
         return self.search(query, categories=categories, **kwargs)
 
     @staticmethod
-    def get_all_categories() -> Dict[str, str]:
+    def get_all_categories() -> Mapping[str, str]:
         """
         获取所有可用的arXiv分类
 
         返回:
-            Dict[str, str]: 分类代码到描述的映射
+            Mapping[str, str]: 分类代码到描述的只读映射
         """
-        return {
-            'cs.AI': '人工智能',
-            'cs.CL': '计算语言学',
-            'cs.CV': '计算机视觉',
-            'cs.LG': '机器学习',
-            'cs.NE': '神经网络',
-            'stat.ML': '机器学习(统计)',
-            'math.OC': '优化和控制',
-            # ... 可以添加更多分类
-        }
+        return _ALL_CATEGORIES
 
 
 # 使用示例
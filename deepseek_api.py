@@ -1,11 +1,54 @@
-from openai import OpenAI
-from typing import Optional, Tuple
+from openai import APITimeoutError, OpenAI
+from typing import List, Optional, Tuple
 from dataclasses import dataclass
-import asyncio
+from pathlib import Path
+import hashlib
+import json
 import time
-from concurrent.futures import ThreadPoolExecutor
 from threading import Event
 
+# 论文分析的系统提示词
+_SYSTEM_PROMPT = """你是一个专业的学术论文分析助手。请分析给定的论文摘要，并从以下几个方面进行总结：
+            1. 研究问题和目标
+            2. 主要方法和技术
+            3. 关键发现和结果
+            4. 创新点和贡献
+            5. 潜在的应用价值
+
+            请用简洁专业的语言进行分析。"""
+
+
+# 一次批量请求最多分析的论文数,保证所有分析能放进 batch_max_tokens
+MAX_BATCH_SIZE = 8
+
+# 批量分析的系统提示词，要求以JSON对象返回每篇论文的分析
+_BATCH_SYSTEM_PROMPT = """你是一个专业的学术论文分析助手。用户会给出多篇带序号的论文摘要，请分别从以下几个方面进行总结：
+            1. 研究问题和目标
+            2. 主要方法和技术
+            3. 关键发现和结果
+            4. 创新点和贡献
+            5. 潜在的应用价值
+
+            请用简洁专业的语言进行分析，并以JSON对象返回，格式为：
+            {"results": [{"i": 序号, "summary": "分析文本"}, ...]}"""
+
+
+def _build_messages(abstract: str) -> List[dict]:
+    """构建分析单篇摘要的对话消息"""
+    return [
+        {"role": "system", "content": _SYSTEM_PROMPT},
+        {"role": "user", "content": f"请分析以下论文摘要：\n\n{abstract}"}
+    ]
+
+
+def _build_batch_messages(abstracts: List[str]) -> List[dict]:
+    """构建一次分析多篇摘要的对话消息"""
+    numbered = "\n\n".join(f"[{i}] {abstract}" for i, abstract in enumerate(abstracts))
+    return [
+        {"role": "system", "content": _BATCH_SYSTEM_PROMPT},
+        {"role": "user", "content": f"请分别分析以下论文摘要：\n\n{numbered}"}
+    ]
+
 
 @dataclass
 class DeepSeekConfig:
@@ -15,20 +58,17 @@ class DeepSeekConfig:
     base_url: str = "https://api.deepseek.com"
     temperature: float = 0.7
     max_tokens: int = 1000
+    batch_max_tokens: int = 8192  # 批量分析时的最大输出长度,实际按论文数估算
     timeout: float = 180.0  # 设置默认超时时间为180秒
-    check_interval: float = 2.0  # 状态检查间隔时间
+    max_retries: int = 5  # 限流或服务端错误时的重试次数(指数退避)
+    cache_dir: str = "./.cache/ds"  # 分析结果缓存目录
 
 
 class RequestStatus:
     """请求状态跟踪器"""
-    def __init__(self):
+    def __init__(self, cancel_event: Optional[Event] = None):
         self.start_time = time.time()
-        self.last_check = self.start_time
-        self.is_completed = False
-        self.has_error = False
-        self.error_message = None
-        self.result = None
-        self._stop_event = Event()
+        self._cancel_event = cancel_event  # 外部共享的取消令牌
 
     def elapsed_time(self) -> float:
         """返回已经过的时间（秒）"""
@@ -36,11 +76,7 @@ class RequestStatus:
 
     def should_stop(self) -> bool:
         """检查是否应该停止请求"""
-        return self._stop_event.is_set()
-
-    def stop(self):
-        """标记应该停止请求"""
-        self._stop_event.set()
+        return self._cancel_event is not None and self._cancel_event.is_set()
 
 
 class DeepSeekAPI:
@@ -50,54 +86,81 @@ class DeepSeekAPI:
         self.client = OpenAI(
             api_key=self.config.api_key,
             base_url=self.config.base_url,
-            timeout=self.config.timeout  # 设置OpenAI客户端的超时时间
+            timeout=self.config.timeout,  # 设置OpenAI客户端的超时时间
+            max_retries=self.config.max_retries
         )
-        self.executor = ThreadPoolExecutor(max_workers=1)
 
-    def process_abstract(self, abstract: str, status_callback=None) -> str:
+    def close(self):
+        """关闭客户端连接，进行中的请求会随之中止"""
+        self.client.close()
+
+    def _cache_path(self, key: str) -> Path:
+        """返回缓存键对应的缓存文件路径"""
+        return Path(self.config.cache_dir) / f"{key}.json"
+
+    def get_cached_result(self, abstract: str) -> Optional[str]:
+        """返回已缓存的分析结果，未命中或模型不同时返回None"""
+        key = hashlib.sha256(abstract.encode()).hexdigest()
+        try:
+            entry = json.loads(self._cache_path(key).read_bytes())
+        except (OSError, ValueError):
+            return None
+        if not isinstance(entry, dict) or entry.get("model") != self.config.model:
+            return None
+        result = entry.get("result")
+        return result if isinstance(result, str) else None
+
+    def _store_result(self, abstract: str, result: str):
+        """原子地写入分析结果缓存"""
+        key = hashlib.sha256(abstract.encode()).hexdigest()
+        entry = {"abstract_sha256": key, "model": self.config.model, "result": result}
+        path = self._cache_path(key)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix('.tmp')
+            tmp.write_text(json.dumps(entry, ensure_ascii=False), encoding='utf-8')
+            tmp.replace(path)
+        except OSError:
+            pass  # 缓存写入失败不影响分析结果
+
+    def process_abstract(
+            self,
+            abstract: str,
+            status_callback=None,
+            cancel_event: Optional[Event] = None,
+            partial_callback=None
+    ) -> str:
         """
         处理论文摘要并返回分析结果
 
         Args:
             abstract: 论文摘要文本
             status_callback: 可选的状态回调函数，用于报告进度
+            cancel_event: 可选的取消令牌，被设置后请求将被放弃
+            partial_callback: 可选的回调函数，流式接收到新内容时传入新增的文本片段
 
         Returns:
             str: 生成的分析文本
 
         Raises:
             TimeoutError: 如果请求超过配置的超时时间
+            InterruptedError: 如果请求被取消
             Exception: 其他可能的错误
         """
+        # 命中缓存时直接返回，不再调用API
+        cached = self.get_cached_result(abstract)
+        if cached is not None:
+            if status_callback:
+                status_callback("分析完成")
+            return cached
+
         # 创建请求状态跟踪器
-        status = RequestStatus()
+        status = RequestStatus(cancel_event)
 
         try:
-            # 在后台线程中执行API调用
-            future = self.executor.submit(
-                self._make_api_call,
-                abstract,
-                status,
-                status_callback
-            )
-
-            # 在主线程中等待结果，同时检查状态
-            while not future.done():
-                # 检查是否超时
-                if status.elapsed_time() > self.config.timeout:
-                    status.stop()  # 标记应该停止
-                    raise TimeoutError(f"请求超时（{self.config.timeout}秒）")
-
-                # 如果提供了回调函数，定期报告状态
-                if status_callback and (time.time() - status.last_check) >= self.config.check_interval:
-                    status_callback(f"正在等待响应... （已用时：{status.elapsed_time():.1f}秒）")
-                    status.last_check = time.time()
-
-                # 短暂休眠以避免密集循环
-                time.sleep(0.1)
-
-            # 获取结果
-            result = future.result()
+            # 直接在调用线程中执行；调用方（线程池任务）已在后台运行
+            result = self._make_api_call(abstract, status, status_callback, partial_callback)
+            self._store_result(abstract, result)
             if status_callback:
                 status_callback("分析完成")
             return result
@@ -112,21 +175,68 @@ class DeepSeekAPI:
                 status_callback(f"发生错误: {str(e)}")
             raise
 
-    def _make_api_call(self, abstract: str, status: RequestStatus, status_callback=None) -> str:
-        """实际执行API调用的内部方法"""
+    def process_abstracts(self, abstracts: List[str], cancel_event: Optional[Event] = None) -> List[Optional[str]]:
+        """
+        在一次请求中分析多篇论文摘要
+
+        Args:
+            abstracts: 论文摘要文本列表
+            cancel_event: 可选的取消令牌，被设置后请求将被放弃
+
+        Returns:
+            List[Optional[str]]: 与输入顺序一致的分析文本，模型未返回的条目为None
+
+        Raises:
+            TimeoutError: 如果请求超过配置的超时时间
+            InterruptedError: 如果请求被取消
+            Exception: 其他可能的错误
+        """
+        results = [self.get_cached_result(abstract) for abstract in abstracts]
+        missing = [i for i, result in enumerate(results) if result is None]
+        if not missing:
+            return results
+
+        if cancel_event is not None and cancel_event.is_set():
+            raise InterruptedError("请求被取消")
+
         try:
-            # 构建提示词
-            system_prompt = """你是一个专业的学术论文分析助手。请分析给定的论文摘要，并从以下几个方面进行总结：
-            1. 研究问题和目标
-            2. 主要方法和技术
-            3. 关键发现和结果
-            4. 创新点和贡献
-            5. 潜在的应用价值
+            response = self.client.chat.completions.create(
+                model=self.config.model,
+                messages=_build_batch_messages([abstracts[i] for i in missing]),
+                temperature=self.config.temperature,
+                max_tokens=min(self.config.batch_max_tokens, self.config.max_tokens * len(missing)),
+                response_format={"type": "json_object"},
+                stream=False
+            )
+        except APITimeoutError:
+            raise TimeoutError(f"请求超时（{self.config.timeout}秒）")
 
-            请用简洁专业的语言进行分析。"""
+        if cancel_event is not None and cancel_event.is_set():
+            raise InterruptedError("请求被取消")
+
+        choice = response.choices[0]
+        if choice.finish_reason == "length":
+            raise ValueError(f"批量分析结果超出长度限制，请减小 batch_size（当前 {len(missing)} 篇）")
 
-            user_prompt = f"请分析以下论文摘要：\n\n{abstract}"
+        # 序号对应本次请求中的位置，映射回原始列表;忽略格式不符的条目
+        data = json.loads(choice.message.content)
+        items = data.get("results") if isinstance(data, dict) else None
+        if not isinstance(items, list):
+            raise ValueError("批量分析结果格式错误")
+        for item in items:
+            if not isinstance(item, dict):
+                continue
+            position = item.get("i")
+            summary = item.get("summary")
+            if isinstance(position, int) and 0 <= position < len(missing) and isinstance(summary, str) and summary:
+                index = missing[position]
+                results[index] = summary
+                self._store_result(abstracts[index], summary)
+        return results
 
+    def _make_api_call(self, abstract: str, status: RequestStatus, status_callback=None, partial_callback=None) -> str:
+        """实际执行API调用的内部方法"""
+        try:
             # 定期检查是否应该停止
             if status.should_stop():
                 raise InterruptedError("请求被取消")
@@ -134,23 +244,30 @@ class DeepSeekAPI:
             # 调用API
             response = self.client.chat.completions.create(
                 model=self.config.model,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ],
+                messages=_build_messages(abstract),
                 temperature=self.config.temperature,
                 max_tokens=self.config.max_tokens,
-                stream=False  # 不使用流式传输，因为我们需要完整的响应
+                stream=True  # 流式传输，边生成边回报已有内容
             )
 
-            # 再次检查是否应该停止
-            if status.should_stop():
-                raise InterruptedError("请求被取消")
+            parts = []  # 收到的文本片段,结束时一次拼接
+            for chunk in response:
+                # 每收到一块内容都检查是否应该停止或已超时
+                if status.should_stop():
+                    response.close()
+                    raise InterruptedError("请求被取消")
+                if status.elapsed_time() > self.config.timeout:
+                    response.close()
+                    raise TimeoutError(f"请求超时（{self.config.timeout}秒）")
+
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if delta:
+                    parts.append(delta)
+                    if partial_callback:
+                        partial_callback(delta)
 
             # 返回生成的文本
-            return response.choices[0].message.content
+            return "".join(parts)
 
-        except Exception as e:
-            status.has_error = True
-            status.error_message = str(e)
-            raise
\ No newline at end of file
+        except APITimeoutError:
+            raise TimeoutError(f"请求超时（{self.config.timeout}秒）")
\ No newline at end of file
@@ -1,57 +1,113 @@
 import json
-import os
+import shutil
 import sys
+from collections import deque
+from pathlib import Path
+from threading import Event
 
-from PyQt6.QtCore import QTimer
+from PyQt6.QtCore import QThreadPool, QTimer
 from PyQt6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout,
                              QHBoxLayout, QLineEdit, QPushButton, QLabel, QComboBox, QSpinBox, QProgressBar,
                              QFileDialog,
                              QMessageBox, QTabWidget)
-from arxiv_api import ArxivAPI, ArxivPaper
-from deepseek_api import DeepSeekAPI
+from arxiv_api import ArxivAPI, ArxivPaper, create_session
+from deepseek_api import DeepSeekAPI, MAX_BATCH_SIZE
 from paper_tab import PaperTab
-from workers import SearchWorker, AnalysisWorker, DownloadWorker
+from workers import SearchTask, AnalysisTask, AnalysisBatchTask, DownloadTask
+
+try:
+    import orjson
+except ImportError:  # 未安装orjson时回退到标准库json
+    orjson = None
+
+# 分类下拉框选项
+CATEGORY_CHOICES = ('所有分类',) + tuple(ArxivAPI.get_all_categories())
+
+# 排序选项到API参数的映射
+SORT_MAP = {
+    '相关度': 'relevance',
+    '最新更新': 'lastUpdatedDate',
+    '提交时间': 'submittedDate'
+}
+SORT_LABELS = tuple(SORT_MAP)
+
+# 短于此长度的摘要不值得分析
+MIN_ABSTRACT_LENGTH = 50
 
 
 class MainWindow(QMainWindow):
     def __init__(self):
         super().__init__()
-        self.api = ArxivAPI()
+        # 所有arXiv请求共享一个HTTP会话,限流时最多重试5次并指数退避,搜索结果缓存15分钟
+        self.http = create_session(retries=5, backoff_factor=2.0, pool_maxsize=16, cache_expire=900)
+        self.api = ArxivAPI(session=self.http)
         self.current_papers = []
-        self.active_threads = []  # 跟踪活动线程
-        self.analysis_queue = []  # 等待分析的论文队列
-        self.analysis_delay = 3  # 线程间延时（秒）
-        self.is_analyzing = False  # 是否正在分析
+        self.thread_pool = QThreadPool.globalInstance()  # 复用线程执行后台任务
+        self.thread_pool.setMaxThreadCount(4)
+        self._cancel_token = Event()  # 当前这一轮搜索的所有任务共享的取消令牌
+        self.search_generation = 0  # 每次新搜索递增,用于丢弃过期任务的信号
+        self.analysis_queue = deque()  # 等待提交的 (论文, 索引)
+        self.cancel_timeout = 100  # 取消任务后等待其结束的时间(毫秒)
+        self.shutdown_timeout = 3000  # 关闭窗口时等待后台任务结束的最长时间(毫秒)
         self.config = "./config.json"
+        self.download_task = None  # 当前的下载任务
         self.download_buttons = []  # 存储下载按钮的列表
         self.download_layout = None  # 用于存储下载按钮的布局引用
         self.paper_tabs = {}  # 存储论文标签页的字典
         self.search_in_progress = False  # 添加搜索状态标志
 
         api_key = None
+        self.cfg = {}  # config.json 中的配置
         # 初始化 DeepSeek API
-        if not os.path.exists(self.config):
-            with open(self.config, "w") as fp:
-                with open('./default_config.json', 'r') as rp:
-                    fp.write(rp.read())
+        config_path = Path(self.config)
+        if not config_path.exists():
+            shutil.copyfile('./default_config.json', config_path)
         else:
-            api_json = json.loads(open('config.json', 'r').read())
-            api_key = api_json['api_key']['deepseek']
+            raw = config_path.read_bytes()
+            self.cfg = orjson.loads(raw) if orjson is not None else json.loads(raw)
+            api_key = self.cfg.get('api_key', {}).get('deepseek')
 
         if (not api_key) or api_key == "YOUR_API_KEY":
             QMessageBox.warning(self, "警告", "未找到 DEEPSEEK_API_KEY 环境变量，论文分析功能将不可用")
         self.deepseek = DeepSeekAPI(api_key) if api_key else None
 
+        # 分析任务使用独立的线程池,同时进行的请求数不超过 max_concurrent
+        max_concurrent = max(1, int(self.cfg.get('max_concurrent', 5)))
+        self.analysis_pool = QThreadPool()
+        self.analysis_pool.setMaxThreadCount(max_concurrent)
+        self.analysis_running = 0  # 已提交且尚未结束的分析任务数
+        # 每次请求分析的论文数
+        self.batch_size = min(max(1, int(self.cfg.get('batch_size', 1))), MAX_BATCH_SIZE)
+
+        # 令牌桶限制发起分析请求的速率,每100毫秒补充一次令牌;
+        # 只在线程池有空闲线程时提交任务,使令牌在请求真正发起时才被消耗
+        self.base_rate = float(max_concurrent)  # 每秒可发起的请求数
+        self.rate = self.base_rate
+        self.burst = float(max_concurrent)  # 令牌桶容量
+        self.tokens = self.burst
+        self.refill_timer = QTimer(self)
+        self.refill_timer.setInterval(100)
+        self.refill_timer.timeout.connect(self._refill)
+        # 被限流后降低速率,冷却一段时间后恢复
+        self.rate_cooldown = QTimer(self)
+        self.rate_cooldown.setSingleShot(True)
+        self.rate_cooldown.setInterval(30000)
+        self.rate_cooldown.timeout.connect(self._reset_rate)
+
         self.init_ui()
 
     def closeEvent(self, event):
         """窗口关闭时的处理"""
-        self.analysis_queue.clear()  # 清空分析队列
-        # 停止所有活动线程
-        for thread in self.active_threads:
-            if hasattr(thread, 'stop'):
-                thread.stop()
-            thread.wait()
+        # 停止所有后台任务并等待线程池空闲
+        self.cancel_active_tasks()
+        self.stop_download()
+        if self.deepseek:
+            self.deepseek.close()  # 中止进行中的分析请求
+        # 限时等待,处于重试退避中的请求无法被中断
+        self.analysis_pool.waitForDone(self.shutdown_timeout)
+        self.thread_pool.waitForDone(self.shutdown_timeout)
+        self.api.close()
+        self.http.close()  # 释放HTTP连接池
         event.accept()
 
     def init_ui(self):
@@ -80,8 +136,7 @@ class MainWindow(QMainWindow):
 
         # 分类选择
         self.category_combo = QComboBox()
-        categories = ['所有分类'] + list(ArxivAPI.get_all_categories().keys())
-        self.category_combo.addItems(categories)
+        self.category_combo.addItems(CATEGORY_CHOICES)
         advanced_layout.addWidget(QLabel('分类:'))
         advanced_layout.addWidget(self.category_combo)
 
@@ -94,7 +149,7 @@ class MainWindow(QMainWindow):
 
         # 排序方式
         self.sort_combo = QComboBox()
-        self.sort_combo.addItems(['相关度', '最新更新', '提交时间'])
+        self.sort_combo.addItems(SORT_LABELS)
         advanced_layout.addWidget(QLabel('排序:'))
         advanced_layout.addWidget(self.sort_combo)
 
@@ -138,7 +193,7 @@ class MainWindow(QMainWindow):
         # 标记搜索开始
         self.search_in_progress = True
 
-        # 停止所有活动线程并清理资源
+        # 取消所有进行中的任务并清理资源
         self.cleanup_before_search()
 
         # 准备搜索参数
@@ -146,82 +201,101 @@ class MainWindow(QMainWindow):
         if category == '所有分类':
             category = None
 
-        sort_map = {
-            '相关度': 'relevance',
-            '最新更新': 'lastUpdatedDate',
-            '提交时间': 'submittedDate'
-        }
-
         search_params = {
             'query': query,
             'max_results': self.results_spin.value(),
-            'sort_by': sort_map[self.sort_combo.currentText()]
+            'sort_by': SORT_MAP[self.sort_combo.currentText()]
         }
 
         if category:
             search_params['categories'] = [category]
 
-        # 创建并启动新的搜索线程
-        self.search_worker = SearchWorker(self.api, search_params)
-        self.search_worker.finished.connect(self.handle_search_results)
-        self.search_worker.error.connect(self.handle_error)
-        self.active_threads.append(self.search_worker)
+        # 创建并提交新的搜索任务
+        self.search_task = SearchTask(self.api, search_params, self._cancel_token)
+        self.search_task.signals.batch_ready.connect(self._current_search_only(self.handle_search_batch))
+        self.search_task.signals.finished.connect(self._current_search_only(self.handle_search_results))
+        self.search_task.signals.error.connect(self._current_search_only(self.handle_error))
 
         self.statusBar().showMessage('正在搜索...')
-        self.search_worker.start()
+        self.thread_pool.start(self.search_task)
 
     def analyze_paper(self, paper: ArxivPaper, index: int):
         """分析论文摘要"""
         if not self.deepseek:
             return
 
-        # 创建并启动分析线程
-        analysis_worker = AnalysisWorker(self.deepseek, paper.abstract, index)
-        analysis_worker.finished.connect(self.handle_analysis_result)
-        analysis_worker.error.connect(self.handle_error)
-        self.active_threads.append(analysis_worker)
-        analysis_worker.start()
+        # 创建并提交分析任务
+        task = AnalysisTask(self.deepseek, paper.abstract, index, self._cancel_token)
+        task.signals.finished.connect(self._current_search_only(self.handle_analysis_result))
+        task.signals.error.connect(self._current_search_only(self.handle_analysis_error))
+        task.signals.rate_limited.connect(self.handle_rate_limited)
+        task.signals.partial_ready.connect(self._current_search_only(self.handle_analysis_partial))
+        self._start_analysis(task)
 
     def handle_analysis_result(self, result: str, paper_index: int):
         """处理分析结果"""
-        try:
-            # 移除已完成的分析请求
-            if self.analysis_queue and self.analysis_queue[0][1] == paper_index:
-                self.analysis_queue.pop(0)
-
-            # 更新UI
-            if paper_index in self.paper_tabs:
-                paper_tab = self.paper_tabs[paper_index]
-                paper_tab.analysis_text.setPlainText(result.strip())
+        # 更新UI
+        if paper_index in self.paper_tabs:
+            paper_tab = self.paper_tabs[paper_index]
+            paper_tab.analysis_text.setPlainText(result.strip())
 
-            # 清理已完成的线程
-            self.clean_finished_threads()
-
-        finally:
-            # 重置分析状态
-            self.is_analyzing = False
+    def handle_analysis_partial(self, paper_index: int, text: str):
+        """将流式生成的文本片段追加到对应论文的分析结果"""
+        if paper_index in self.paper_tabs:
+            self.paper_tabs[paper_index].append_analysis(text)
 
-            # 如果队列中还有论文,设置定时器处理下一个
-            if self.analysis_queue:
-                QTimer.singleShot(self.analysis_delay * 1000, self.process_analysis_queue)
+    def handle_cache_hit(self, result: str, paper_index: int):
+        """显示来自缓存的分析结果"""
+        self.handle_analysis_result(result, paper_index)
+        self.statusBar().showMessage(f'论文 {paper_index + 1} 的分析结果来自缓存')
 
     def handle_search_results(self, papers):
         """处理搜索结果"""
+        # 重置搜索状态;搜索结束后分析队列中不足一批的论文也会被提交
+        self.search_in_progress = False
+        self.current_papers = papers
+
+        if not papers and self.paper_tabs:
+            # 解析中途出错,保留已随批次显示的论文并分析其余排队的论文
+            self.current_papers = [tab.paper for tab in self.paper_tabs.values()]
+            self.download_layout.addStretch()
+            self.statusBar().showMessage(f'搜索中断: 仅显示已解析的 {len(self.paper_tabs)} 篇论文')
+            self.process_analysis_queue()
+            return
+
+        if not papers:
+            # 显示无结果的标签页
+            no_results = QWidget()
+            layout = QVBoxLayout(no_results)
+            layout.addWidget(QLabel('未找到相关论文'))
+            self.tab_widget.addTab(no_results, '搜索结果')
+            self.statusBar().showMessage('搜索完成: 未找到结果')
+            return
+
+        # 添加尚未随批次显示的论文
+        self.add_papers(papers[len(self.paper_tabs):])
+
+        # 添加弹性空间到下载按钮布局底部
+        self.download_layout.addStretch()
+
+        self.statusBar().showMessage(f'搜索完成: 找到 {len(papers)} 篇论文')
+
+    def handle_search_batch(self, papers):
+        """搜索仍在解析时先显示已解析的一批论文"""
+        self.add_papers(papers)
+        self.statusBar().showMessage(f'正在搜索: 已找到 {len(self.paper_tabs)} 篇论文')
+
+    def add_papers(self, papers):
+        """为论文创建标签页和下载按钮,并开始分析"""
+        # 为每篇论文创建标签页;批量添加期间暂停重绘和信号
+        cache_hit = self._current_search_only(self.handle_cache_hit)
+        show_result = self._current_search_only(self.handle_analysis_result)
+        download_widget = self.download_layout.parentWidget()
+        self.tab_widget.setUpdatesEnabled(False)
+        self.tab_widget.blockSignals(True)
+        download_widget.setUpdatesEnabled(False)
         try:
-            self.clean_finished_threads()
-            self.current_papers = papers
-
-            if not papers:
-                # 显示无结果的标签页
-                no_results = QWidget()
-                layout = QVBoxLayout(no_results)
-                layout.addWidget(QLabel('未找到相关论文'))
-                self.tab_widget.addTab(no_results, '搜索结果')
-                self.statusBar().showMessage('搜索完成: 未找到结果')
-                return
-
-            # 为每篇论文创建标签页
-            for i, paper in enumerate(papers, 1):
+            for i, paper in enumerate(papers, len(self.paper_tabs) + 1):
                 # 创建论文标签页
                 paper_tab = PaperTab(paper)
                 tab_title = f"论文 {i}: {paper.title[:20]}..."
@@ -235,81 +309,95 @@ class MainWindow(QMainWindow):
                 self.download_buttons.append(download_btn)
                 self.download_layout.addWidget(download_btn)
 
-                # 将论文添加到分析队列
+                # 摘要过短或已缓存的论文在事件循环中直接显示结果,其余的添加到分析队列
                 if self.deepseek:
-                    self.analysis_queue.append((paper, i - 1))
-
-            # 添加弹性空间到下载按钮布局底部
-            self.download_layout.addStretch()
-
-            self.statusBar().showMessage(f'搜索完成: 找到 {len(papers)} 篇论文')
-
-            # 开始处理分析队列
-            if self.deepseek and not self.is_analyzing:
-                QTimer.singleShot(100, self.process_analysis_queue)
-
+                    if len(paper.abstract.strip()) < MIN_ABSTRACT_LENGTH:
+                        QTimer.singleShot(0, lambda idx=i - 1: show_result("(摘要过短，已跳过)", idx))
+                        continue
+                    cached = self.deepseek.get_cached_result(paper.abstract)
+                    if cached is not None:
+                        QTimer.singleShot(0, lambda r=cached, idx=i - 1: cache_hit(r, idx))
+                    else:
+                        paper_tab.analysis_text.setPlaceholderText("正在分析论文...")
+                        self.analysis_queue.append((paper, i - 1))
         finally:
-            # 重置搜索状态
-            self.search_in_progress = False
+            self.tab_widget.blockSignals(False)
+            self.tab_widget.setUpdatesEnabled(True)
+            download_widget.setUpdatesEnabled(True)
+
+        # 开始处理分析队列
+        self.process_analysis_queue()
 
     def process_analysis_queue(self):
-        """处理分析队列"""
-        if not self.analysis_queue or self.is_analyzing:
+        """按令牌桶的速率将队列中的论文提交到分析线程池,线程池已满时留在队列中等待"""
+        while (self.analysis_queue and self.tokens >= 1
+               and self.analysis_running < self.analysis_pool.maxThreadCount()):
+            self.tokens -= 1
+            if self.batch_size == 1:
+                paper, index = self.analysis_queue.popleft()
+                self.analyze_paper(paper, index)
+                continue
+
+            # 每 batch_size 篇论文合并为一次请求;搜索仍在进行时只提交满批,剩余的等搜索结束后再提交
+            if self.search_in_progress and len(self.analysis_queue) < self.batch_size:
+                break
+            count = min(self.batch_size, len(self.analysis_queue))
+            batch = [self.analysis_queue.popleft() for _ in range(count)]
+            self.analyze_papers([(index, paper.abstract) for paper, index in batch])
+
+        if self.tokens < self.burst and not self.refill_timer.isActive():
+            self.refill_timer.start()
+
+    def _refill(self):
+        """补充令牌并继续提交等待中的论文"""
+        self.tokens = min(self.burst, self.tokens + self.rate * 0.1)
+        if self.analysis_queue:
+            self.process_analysis_queue()
+        elif self.tokens >= self.burst:
+            self.refill_timer.stop()
+
+    def handle_rate_limited(self):
+        """请求被限流时速率减半,冷却期内再次限流会继续减半"""
+        self.rate = max(self.rate / 2, 0.1)
+        self.rate_cooldown.start()
+
+    def _reset_rate(self):
+        """限流冷却结束,恢复初始速率"""
+        self.rate = self.base_rate
+
+    def analyze_papers(self, papers):
+        """在一次请求中分析多篇论文的摘要"""
+        if not self.deepseek:
             return
 
-        self.is_analyzing = True
+        task = AnalysisBatchTask(self.deepseek, papers, self._cancel_token)
+        task.signals.finished.connect(self._current_search_only(self.handle_analysis_result))
+        task.signals.error.connect(self._current_search_only(self.handle_analysis_error))
+        task.signals.rate_limited.connect(self.handle_rate_limited)
+        self._start_analysis(task)
 
-        try:
-            paper, index = self.analysis_queue[0]
-
-            if index not in self.paper_tabs:
-                self.analysis_queue.pop(0)
-                self.is_analyzing = False
-                return
-
-            paper_tab = self.paper_tabs[index]
-            paper_tab.analysis_text.setPlainText("正在准备分析论文...")
-
-            # 创建并配置分析线程
-            analysis_worker = AnalysisWorker(self.deepseek, paper.abstract, index)
-            analysis_worker.finished.connect(self.handle_analysis_result)
-            analysis_worker.error.connect(self.handle_analysis_error)
-            # 连接状态更新信号
-            analysis_worker.status_update.connect(
-                lambda msg, tab=paper_tab: tab.analysis_text.setPlainText(msg)
-            )
-
-            self.active_threads.append(analysis_worker)
-            analysis_worker.start()
+    def _start_analysis(self, task):
+        """提交分析任务,任务结束后继续处理分析队列"""
+        task.signals.done.connect(self._analysis_done)
+        self.analysis_running += 1
+        self.analysis_pool.start(task)
 
-        except Exception as e:
-            self.is_analyzing = False
-            self.statusBar().showMessage(f'分析过程出错: {str(e)}')
+    def _analysis_done(self):
+        """分析任务结束(包括被取消的旧任务),空出的线程留给队列中的论文"""
+        self.analysis_running -= 1
+        self.process_analysis_queue()
 
     def handle_error(self, error_msg):
         """处理错误"""
-        # 清理已完成的线程
-        self.clean_finished_threads()
-
         self.statusBar().showMessage(f'发生错误: {error_msg}')
         QMessageBox.warning(self, "错误", f"处理过程中出现错误：{error_msg}")
 
-    def handle_analysis_error(self, error_msg: str):
+    def handle_analysis_error(self, error_msg: str, paper_index: int):
         """处理分析错误"""
-        try:
-            # 移除导致错误的分析请求
-            if self.analysis_queue:
-                self.analysis_queue.pop(0)
+        if paper_index in self.paper_tabs:
+            self.paper_tabs[paper_index].analysis_text.setPlainText(f"分析出错: {error_msg}")
 
-            self.statusBar().showMessage(f'分析出错: {error_msg}')
-
-        finally:
-            # 重置分析状态
-            self.is_analyzing = False
-
-            # 尝试处理队列中的下一个请求
-            if self.analysis_queue:
-                QTimer.singleShot(self.analysis_delay * 1000, self.process_analysis_queue)
+        self.statusBar().showMessage(f'分析出错: {error_msg}')
 
     def download_paper(self, paper):
         """下载论文"""
@@ -322,21 +410,33 @@ class MainWindow(QMainWindow):
         )
 
         if save_path:
+            # 同一时间只进行一个下载
+            self.stop_download()
             self.progress_bar.show()
             self.progress_bar.setValue(0)
 
-            # 创建并启动下载线程
-            self.download_worker = DownloadWorker(
+            # 创建并提交下载任务
+            self.download_task = DownloadTask(
                 self.api,
                 paper,
                 save_path
             )
-            self.download_worker.finished.connect(self.handle_download_finished)
-            self.download_worker.error.connect(self.handle_error)
-            self.download_worker.progress.connect(self.progress_bar.setValue)
+            self.download_task.signals.finished.connect(self.handle_download_finished)
+            self.download_task.signals.error.connect(self.handle_error)
+            self.download_task.signals.progress.connect(self.progress_bar.setValue)
 
             self.statusBar().showMessage('正在下载...')
-            self.download_worker.start()
+            self.thread_pool.start(self.download_task)
+
+    def stop_download(self):
+        """中止当前的下载,并忽略它之后发出的信号"""
+        if self.download_task:
+            self.download_task.stop()
+            signals = self.download_task.signals
+            signals.finished.disconnect()
+            signals.error.disconnect()
+            signals.progress.disconnect()
+            self.download_task = None
 
     def handle_download_finished(self, success):
         """处理下载完成"""
@@ -346,35 +446,30 @@ class MainWindow(QMainWindow):
         else:
             self.statusBar().showMessage('下载失败')
 
-    def stop_active_threads(self):
-        """停止所有活动线程"""
-        for thread in self.active_threads:
-            if hasattr(thread, 'stop'):
-                thread.stop()
-            if thread.isRunning():
-                thread.wait()
-        self.active_threads.clear()
-
-    def cleanup_before_search(self):
-        """在开始新搜索前清理资源"""
-        # 确保所有分析线程都被正确停止
-        for thread in self.active_threads:
-            if isinstance(thread, AnalysisWorker):
-                thread.stop()
+    def _current_search_only(self, slot):
+        """包装槽函数,丢弃来自已被新搜索取代的任务的信号"""
+        generation = self.search_generation
 
-        # 等待所有线程完成
-        for thread in self.active_threads:
-            if thread.isRunning():
-                thread.wait()
+        def wrapper(*args):
+            if generation == self.search_generation:
+                slot(*args)
+        return wrapper
 
-        # 清空线程列表
-        self.active_threads.clear()
-
-        # 清空分析队列
+    def cancel_active_tasks(self):
+        """取消当前这一轮的所有搜索和分析任务"""
+        self._cancel_token.set()
         self.analysis_queue.clear()
 
-        # 重置分析状态
-        self.is_analyzing = False
+        # 新任务使用新的令牌和代号,旧任务的信号将被忽略
+        self._cancel_token = Event()
+        self.search_generation += 1
+
+    def cleanup_before_search(self):
+        """在开始新搜索前清理资源"""
+        # 取消仍在进行的任务,只短暂等待;其余任务会在下一个检查点自行退出
+        self.cancel_active_tasks()
+        self.thread_pool.waitForDone(self.cancel_timeout)
+        self.analysis_pool.waitForDone(self.cancel_timeout)
 
         # 清理UI元素
         self.tab_widget.clear()
@@ -386,15 +481,12 @@ class MainWindow(QMainWindow):
         self.download_buttons.clear()
 
         if self.download_layout:
-            while self.download_layout.count():
-                item = self.download_layout.takeAt(0)
+            # 从末尾取出布局项,避免每次移除都整体前移剩余项
+            for i in reversed(range(self.download_layout.count())):
+                item = self.download_layout.takeAt(i)
                 if item.widget():
                     item.widget().deleteLater()
 
-    def clean_finished_threads(self):
-        """清理已完成的线程"""
-        self.active_threads = [thread for thread in self.active_threads if thread.isRunning()]
-
 
 def main():
     app = QApplication(sys.argv)
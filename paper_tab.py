@@ -1,5 +1,8 @@
+import html
+
 from PyQt6.QtCore import Qt
-from PyQt6.QtWidgets import QWidget, QVBoxLayout, QScrollArea, QGridLayout, QTextEdit, QLabel
+from PyQt6.QtGui import QTextCursor
+from PyQt6.QtWidgets import QWidget, QVBoxLayout, QScrollArea, QTextEdit, QLabel
 
 from arxiv_api import ArxivPaper
 
@@ -10,53 +13,54 @@ class PaperTab(QWidget):
     def __init__(self, paper: ArxivPaper, parent=None):
         super().__init__(parent)
         self.paper = paper
-        self.init_ui()
+        self.authors_text = ", ".join(paper.authors)
+        self.categories_text = ", ".join(paper.categories)
+        self._built = False  # 界面在首次显示时才创建
+        QVBoxLayout(self)
 
-    def init_ui(self):
-        """初始化标签页界面"""
-        layout = QVBoxLayout(self)
+        # 分析结果在界面创建前就可能到达,因此提前创建
+        self.analysis_text = QTextEdit()
+        self.analysis_text.setReadOnly(True)
+        self.analysis_text.setPlaceholderText("等待分析...")
+        self.analysis_text.setMinimumHeight(100)
+
+    def showEvent(self, event):
+        """首次显示时创建界面"""
+        if not self._built:
+            self._build()
+            self._built = True
+        super().showEvent(event)
 
+    def _build(self):
+        """初始化标签页界面"""
         # 创建一个滚动区域来容纳所有内容
         scroll = QScrollArea()
         scroll.setWidgetResizable(True)
         content_widget = QWidget()
         content_layout = QVBoxLayout(content_widget)
 
-        # 使用网格布局来展示论文信息
-        grid = QGridLayout()
-
-        # 添加论文详细信息
+        # 添加论文详细信息,所有字段拼成一个表格,由单个标签一次排版
         labels = [
-            ("标题:", self.paper.title),
-            ("作者:", ", ".join(self.paper.authors)),
-            ("分类:", ", ".join(self.paper.categories)),
-            ("发布日期:", self.paper.published_date),
-            ("arXiv ID:", self.paper.paper_id),
-            ("PDF链接:", self.paper.pdf_url),
-            ("arXiv链接:", self.paper.arxiv_url)
+            ("标题:", html.escape(self.paper.title)),
+            ("作者:", html.escape(self.authors_text)),
+            ("分类:", html.escape(self.categories_text)),
+            ("发布日期:", html.escape(self.paper.published_date)),
+            ("arXiv ID:", html.escape(self.paper.paper_id)),
+            ("PDF链接:", self._link(self.paper.pdf_url)),
+            ("arXiv链接:", self._link(self.paper.arxiv_url))
         ]
-
-        for i, (label, value) in enumerate(labels):
-            # 创建标签
-            label_widget = QLabel(label)
-            label_widget.setStyleSheet("font-weight: bold;")
-
-            # 创建值的文本框
-            if label == "摘要:":
-                value_widget = QTextEdit()
-                value_widget.setReadOnly(True)
-                value_widget.setMaximumHeight(100)
-                value_widget.setPlainText(value)
-            else:
-                value_widget = QLabel(value)
-                value_widget.setWordWrap(True)
-                value_widget.setTextInteractionFlags(
-                    Qt.TextInteractionFlag.TextSelectableByMouse |
-                    Qt.TextInteractionFlag.TextBrowserInteraction
-                )
-
-            grid.addWidget(label_widget, i, 0)
-            grid.addWidget(value_widget, i, 1)
+        rows = "".join(
+            f"<tr><td style='font-weight: bold; padding-right: 8px;'>{label}</td><td>{value}</td></tr>"
+            for label, value in labels
+        )
+        info_label = QLabel(f"<table>{rows}</table>")
+        info_label.setWordWrap(True)
+        info_label.setOpenExternalLinks(True)
+        info_label.setTextInteractionFlags(
+            Qt.TextInteractionFlag.TextSelectableByMouse |
+            Qt.TextInteractionFlag.TextBrowserInteraction
+        )
+        content_layout.addWidget(info_label)
 
         # 添加摘要（使用文本编辑框以支持更长的文本）
         abstract_label = QLabel("摘要:")
@@ -66,21 +70,10 @@ class PaperTab(QWidget):
         abstract_text.setReadOnly(True)
         abstract_text.setMinimumHeight(100)  # 为摘要设置最小高度
 
-        grid.addWidget(abstract_label, len(labels), 0)
-        grid.addWidget(abstract_text, len(labels), 1)
-
-        # 设置第二列（值）的拉伸因子
-        grid.setColumnStretch(1, 1)
-
-        # 将网格布局添加到内容布局中
-        content_layout.addLayout(grid)
+        content_layout.addWidget(abstract_label)
+        content_layout.addWidget(abstract_text)
 
         # 为DeepSeek分析预留位置
-        self.analysis_text = QTextEdit()
-        self.analysis_text.setReadOnly(True)
-        self.analysis_text.setPlaceholderText("等待分析...")
-        self.analysis_text.setMinimumHeight(100)
-
         analysis_label = QLabel("DeepSeek 分析:")
         analysis_label.setStyleSheet("font-weight: bold;")
         content_layout.addWidget(analysis_label)
@@ -91,4 +84,16 @@ class PaperTab(QWidget):
 
         # 设置滚动区域的内容
         scroll.setWidget(content_widget)
-        layout.addWidget(scroll)
+        self.layout().addWidget(scroll)
+
+    @staticmethod
+    def _link(url: str) -> str:
+        """生成可点击的链接"""
+        url = html.escape(url)
+        return f"<a href='{url}'>{url}</a>"
+
+    def append_analysis(self, text: str):
+        """在分析结果末尾追加文本,只排版新增的部分"""
+        cursor = QTextCursor(self.analysis_text.document())
+        cursor.movePosition(QTextCursor.MoveOperation.End)
+        cursor.insertText(text)
@@ -1,85 +1,165 @@
-from PyQt6.QtCore import QThread, pyqtSignal
+from threading import Event
+from typing import Optional
 
+from openai import RateLimitError
+from PyQt6.QtCore import QObject, QRunnable, pyqtSignal
 
-class SearchWorker(QThread):
-    """后台搜索线程"""
+
+class SearchSignals(QObject):
+    """搜索任务的信号"""
     finished = pyqtSignal(list)
     error = pyqtSignal(str)
+    batch_ready = pyqtSignal(list)  # 解析过程中按批发送的论文
+
+
+class SearchTask(QRunnable):
+    """后台搜索任务"""
 
-    def __init__(self, api, search_params):
+    def __init__(self, api, search_params, cancel_token: Optional[Event] = None):
         super().__init__()
         self.api = api
         self.search_params = search_params
-        self.is_running = True
+        self.signals = SearchSignals()
+        self.cancel_token = cancel_token or Event()
+
+    def batch_callback(self, papers):
+        """转发已解析的一批论文"""
+        if not self.cancel_token.is_set():
+            self.signals.batch_ready.emit(papers)
 
     def run(self):
         try:
-            if self.is_running:
-                results = self.api.search(**self.search_params)
-                self.finished.emit(results)
+            if not self.cancel_token.is_set():
+                results = self.api.search(**self.search_params, batch_callback=self.batch_callback)
+                if not self.cancel_token.is_set():
+                    self.signals.finished.emit(results)
         except Exception as e:
-            self.error.emit(str(e))
-
-    def stop(self):
-        self.is_running = False
+            if not self.cancel_token.is_set():
+                self.signals.error.emit(str(e))
 
 
-class AnalysisWorker(QThread):
-    """后台分析线程"""
+class AnalysisSignals(QObject):
+    """分析任务的信号"""
     finished = pyqtSignal(str, int)
-    error = pyqtSignal(str)
-    status_update = pyqtSignal(str)  # 新增状态更新信号
+    error = pyqtSignal(str, int)  # 错误信息, 论文索引
+    partial_ready = pyqtSignal(int, str)  # 论文索引, 新生成的文本片段
+    rate_limited = pyqtSignal()  # 请求被限流(HTTP 429)时每个请求发送一次
+    done = pyqtSignal()  # 任务结束时发送一次,包括被取消的任务
+
+
+class AnalysisTask(QRunnable):
+    """后台分析任务,分析单篇论文的摘要"""
 
-    def __init__(self, api, abstract: str, paper_index: int):
+    def __init__(self, api, abstract: str, paper_index: int, cancel_token: Optional[Event] = None):
         super().__init__()
         self.api = api
         self.abstract = abstract
         self.paper_index = paper_index
-        self._is_running = True
+        self.signals = AnalysisSignals()
+        self.cancel_token = cancel_token or Event()
 
-    def status_callback(self, message: str):
-        """处理API的状态更新"""
-        if self._is_running:
-            self.status_update.emit(message)
+    def partial_callback(self, text: str):
+        """转发流式生成的文本片段"""
+        if not self.cancel_token.is_set():
+            self.signals.partial_ready.emit(self.paper_index, text)
 
     def run(self):
         try:
-            if self._is_running and self.api:
-                # 使用状态回调处理API调用
+            if not self.cancel_token.is_set() and self.api:
                 result = self.api.process_abstract(
                     self.abstract,
-                    status_callback=self.status_callback
+                    cancel_event=self.cancel_token,
+                    partial_callback=self.partial_callback
                 )
-                if self._is_running:
-                    self.finished.emit(result, self.paper_index)
+                if not self.cancel_token.is_set():
+                    self.signals.finished.emit(result, self.paper_index)
         except TimeoutError as e:
-            if self._is_running:
-                self.error.emit(f"分析超时: {str(e)}")
+            if not self.cancel_token.is_set():
+                self.signals.error.emit(f"分析超时: {str(e)}", self.paper_index)
+        except RateLimitError as e:
+            if not self.cancel_token.is_set():
+                self.signals.rate_limited.emit()
+                self.signals.error.emit(str(e), self.paper_index)
         except Exception as e:
-            if self._is_running:
-                self.error.emit(str(e))
+            if not self.cancel_token.is_set():
+                self.signals.error.emit(str(e), self.paper_index)
+        finally:
+            self.signals.done.emit()
 
-    def stop(self):
-        """安全地停止线程"""
-        self._is_running = False
-        self.wait()
+
+class AnalysisBatchTask(QRunnable):
+    """后台批量分析任务,在一次请求中分析多篇论文的摘要"""
+
+    def __init__(self, api, papers, cancel_token: Optional[Event] = None):
+        super().__init__()
+        self.api = api
+        self.papers = papers
+        self.signals = AnalysisSignals()
+        self.cancel_token = cancel_token or Event()
+
+    def run(self):
+        try:
+            if self.cancel_token.is_set() or not self.api:
+                return
+            results = self.api.process_abstracts(
+                [abstract for _, abstract in self.papers],
+                cancel_event=self.cancel_token
+            )
+            if self.cancel_token.is_set():
+                return
+            for position, (index, _) in enumerate(self.papers):
+                if results[position] is None:
+                    self.signals.error.emit("批量分析结果中缺少该论文", index)
+                else:
+                    self.signals.finished.emit(results[position], index)
+        except TimeoutError as e:
+            self._emit_error(f"分析超时: {str(e)}")
+        except RateLimitError as e:
+            if not self.cancel_token.is_set():
+                self.signals.rate_limited.emit()
+            self._emit_error(str(e))
+        except Exception as e:
+            self._emit_error(str(e))
+        finally:
+            self.signals.done.emit()
+
+    def _emit_error(self, error_msg: str):
+        """向这一批的每篇论文报告错误"""
+        if not self.cancel_token.is_set():
+            for index, _ in self.papers:
+                self.signals.error.emit(error_msg, index)
 
 
-class DownloadWorker(QThread):
-    """后台下载线程"""
+class DownloadSignals(QObject):
+    """下载任务的信号"""
     progress = pyqtSignal(int)
     finished = pyqtSignal(bool)
     error = pyqtSignal(str)
 
+
+class DownloadTask(QRunnable):
+    """后台下载任务"""
+
     def __init__(self, api, paper, save_path):
         super().__init__()
         self.api = api
         self.paper = paper
         self.save_path = save_path
+        self.signals = DownloadSignals()
+        self.cancel_event = Event()
+
+    def stop(self):
+        """请求中止下载"""
+        self.cancel_event.set()
 
     def run(self):
         try:
-            success = self.api.download_paper(self.paper, self.save_path)
-            self.finished.emit(success)
+            success = self.api.download_paper(
+                self.paper,
+                self.save_path,
+                progress_callback=self.signals.progress.emit,
+                cancel_event=self.cancel_event
+            )
+            self.signals.finished.emit(success)
         except Exception as e:
-            self.error.emit(str(e))
\ No newline at end of file
+            self.signals.error.emit(str(e))